@@ -207,6 +207,51 @@ class BeamDataAgent:
         """重置对话历史"""
         self.conversation_history = []
         print("对话历史已重置")
+    
+    def warmup(self) -> bool:
+        """
+        预热系统，将首次查询的冷启动开销提前到初始化阶段
+        
+        依次加载知识库索引并执行一次检索、建立与 LLM 服务的连接、加载束流数据和 PLS 模型。
+        任一步骤失败只打印警告，不影响后续使用。
+        
+        Returns:
+            所有步骤是否均预热成功
+        """
+        success = True
+        
+        # 1. 加载知识库索引（全局单例，后续检索直接复用）
+        try:
+            from knowledge.rag_tool import get_online_retriever
+            retriever = get_online_retriever()
+            if retriever is not None:
+                retriever.search("__warmup__", top_k=1)
+        except Exception as e:
+            print(f"警告: 知识库预热失败: {e}")
+            success = False
+        
+        # 2. 建立与 LLM 服务的连接（客户端复用该连接）；服务不可达时快速失败，不阻塞启动
+        try:
+            self.client.with_options(timeout=5, max_retries=0).chat.completions.create(
+                model=self.model,
+                messages=[{"role": "system", "content": "ping"}],
+                max_tokens=1
+            )
+        except Exception as e:
+            print(f"警告: LLM 连接预热失败: {e}")
+            success = False
+        
+        # 3. 加载束流数据和 PLS 模型（共享实例，工具调用时直接复用）
+        try:
+            from tools.data_query import get_data_query_tool
+            from tools.pls_analysis import get_pls_analysis_tool
+            get_data_query_tool()
+            get_pls_analysis_tool()
+        except Exception as e:
+            print(f"警告: 数据与模型预加载失败: {e}")
+            success = False
+        
+        return success
 
 
 class StreamingBeamDataAgent(BeamDataAgent):
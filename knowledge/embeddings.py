@@ -4,6 +4,8 @@
 from typing import List, Union
 import numpy as np
 from abc import ABC, abstractmethod
+import atexit
+import functools
 import os
 import sys
 
@@ -82,6 +84,20 @@ class SimpleEmbedder(BaseEmbedder):
         return self.vectorizer.transform(texts).toarray()
 
 
+@functools.lru_cache(maxsize=None)
+def _get_openai_client(api_key: str, base_url: str):
+    """
+    获取共享的 OpenAI 客户端（按 api_key 和 base_url 复用）
+    
+    多个 APIEmbedder 实例共用同一客户端的连接池，避免每次创建实例都重新建立 TCP/TLS 连接。
+    进程退出时关闭客户端。
+    """
+    from openai import OpenAI
+    client = OpenAI(api_key=api_key, base_url=base_url)
+    atexit.register(client.close)
+    return client
+
+
 class APIEmbedder(BaseEmbedder):
     """使用 API 进行 Embedding（如 OpenAI, ModelScope）"""
     
@@ -113,8 +129,7 @@ class APIEmbedder(BaseEmbedder):
             )
         
         try:
-            from openai import OpenAI
-            self.client = OpenAI(api_key=self.api_key, base_url=self.base_url)
+            self.client = _get_openai_client(self.api_key, self.base_url)
         except ImportError:
             raise ImportError("需要安装 openai 包: pip install openai")
     
@@ -1,6 +1,7 @@
 """离线文档处理器 - 解析、分块、向量化和索引"""
 import os
 import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import List, Dict, Any, Optional
 
 # 支持直接运行和作为模块导入
@@ -69,12 +70,17 @@ class OfflineProcessor:
         print(f"分块器: {chunker_type}")
         print(f"向量化: {embedder_type}")
     
-    def process_directory(self, file_types: Optional[List[str]] = None) -> Dict[str, Any]:
+    def process_directory(
+        self,
+        file_types: Optional[List[str]] = None,
+        max_workers: int = 3
+    ) -> Dict[str, Any]:
         """
         处理整个目录的文档
         
         Args:
             file_types: 要处理的文件类型列表，如 ['.pdf', '.txt']，None表示所有支持的类型
+            max_workers: 使用 MinerU API 时并行解析的线程数（本地 PyMuPDF 解析由 ParserFactory 加锁串行执行）
             
         Returns:
             处理统计信息
@@ -102,12 +108,17 @@ class OfflineProcessor:
             "files_details": []
         }
         
-        for file_path in files_to_process:
+        # 解析文档：MinerU API 以上传/轮询等待为主，各文件相互独立，可先并行解析；否则逐个解析
+        texts = None
+        if max_workers > 1 and os.getenv("MINERU_API_KEY"):
+            texts = self._parse_parallel(files_to_process, max_workers)
+        
+        for i, file_path in enumerate(files_to_process):
             filename = os.path.basename(file_path)
             print(f"处理文件: {filename}")
             
             # 解析文档
-            text = ParserFactory.parse_document(file_path)
+            text = texts[i] if texts is not None else ParserFactory.parse_document(file_path)
             
             if not text:
                 print(f"  跳过（解析失败或为空）\n")
@@ -187,6 +198,30 @@ class OfflineProcessor:
         
         return stats
     
+    def _parse_parallel(self, files: List[str], max_workers: int) -> List[Optional[str]]:
+        """
+        多线程解析文档，每个文件解析完成时打印进度
+        
+        Args:
+            files: 文件路径列表
+            max_workers: 线程数
+            
+        Returns:
+            解析得到的文本列表，顺序与 files 一致，解析失败的为 None
+        """
+        texts = [None] * len(files)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(ParserFactory.parse_document, file_path): i
+                for i, file_path in enumerate(files)
+            }
+            for done, future in enumerate(as_completed(futures), 1):
+                i = futures[future]
+                texts[i] = future.result()
+                print(f"解析完成 ({done}/{len(files)}): {os.path.basename(files[i])}")
+        print()
+        return texts
+    
     def _scan_directory(self, file_types: Optional[List[str]] = None) -> List[str]:
         """
         扫描目录获取文件列表
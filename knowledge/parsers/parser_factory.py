@@ -1,5 +1,6 @@
 """解析器工厂"""
 import os
+import threading
 from typing import Optional
 from dotenv import load_dotenv
 from .base_parser import BaseParser
@@ -37,6 +38,9 @@ class ParserFactory:
         '.pdf': None,  # 动态选择
     }
     
+    # 本地 PyMuPDF 非线程安全，多线程解析时逐个执行
+    _local_pdf_lock = threading.Lock()
+    
     @classmethod
     def parse_document(cls, file_path: str) -> Optional[str]:
         """
@@ -55,6 +59,9 @@ class ParserFactory:
         if ext == '.pdf':
             try:
                 parser = cls._get_pdf_parser()
+                if isinstance(parser, PdfParser):
+                    with cls._local_pdf_lock:
+                        return parser.parse(file_path)
                 return parser.parse(file_path)
             except Exception as e:
                 print(f"解析文档失败 {file_path}: {e}")
@@ -6,6 +6,17 @@
 from agents import BeamDataAgent, StreamingBeamDataAgent
 from config import Config
 import sys
+import time
+
+
+# 交互命令
+EXIT_COMMANDS = frozenset({'exit', 'quit', '退出'})
+RESET_COMMANDS = frozenset({'reset', '重置'})
+HELP_COMMANDS = frozenset({'help', '帮助'})
+
+# 流式输出合并写出的时间窗口（秒）和字符数上限
+STREAM_FLUSH_INTERVAL = 0.02
+STREAM_FLUSH_CHARS = 64
 
 
 def print_banner():
@@ -69,6 +80,8 @@ def main():
             base_url=config['base_url'],
             model=config['model']
         )
+        if agent.warmup():
+            print("✓ 系统预热完成")
         print("✓ 系统初始化成功！\n")
     except Exception as e:
         print(f"✗ 系统初始化失败: {e}")
@@ -79,24 +92,24 @@ def main():
         try:
             # 获取用户输入
             user_input = input("\n您: ").strip()
+            if not user_input:
+                continue
             
             # 处理特殊命令
-            if user_input.lower() in ['exit', 'quit', '退出']:
+            command = user_input.lower()
+            if command in EXIT_COMMANDS:
                 print("\n感谢使用！再见！👋")
                 break
             
-            if user_input.lower() in ['reset', '重置']:
+            if command in RESET_COMMANDS:
                 agent.reset_conversation()
                 print("✓ 对话历史已清空")
                 continue
             
-            if user_input.lower() in ['help', '帮助']:
+            if command in HELP_COMMANDS:
                 print_help()
                 continue
             
-            if not user_input:
-                continue
-            
             # 调用代理处理用户输入
             print("\n助手: ", end="", flush=True)
             response = agent.chat(user_input)
@@ -126,6 +139,8 @@ def main_stream():
             base_url=config['base_url'],
             model=config['model']
         )
+        if agent.warmup():
+            print("✓ 系统预热完成")
         print("✓ 系统初始化成功！\n")
     except Exception as e:
         print(f"✗ 系统初始化失败: {e}")
@@ -136,29 +151,48 @@ def main_stream():
         try:
             # 获取用户输入
             user_input = input("\n您: ").strip()
+            if not user_input:
+                continue
             
             # 处理特殊命令
-            if user_input.lower() in ['exit', 'quit', '退出']:
+            command = user_input.lower()
+            if command in EXIT_COMMANDS:
                 print("\n感谢使用！再见！👋")
                 break
             
-            if user_input.lower() in ['reset', '重置']:
+            if command in RESET_COMMANDS:
                 agent.reset_conversation()
                 print("✓ 对话历史已清空")
                 continue
             
-            if user_input.lower() in ['help', '帮助']:
+            if command in HELP_COMMANDS:
                 print_help()
                 continue
             
-            if not user_input:
-                continue
-            
             # 调用代理处理用户输入（流式）
             print("\n助手: ", end="", flush=True)
+            # 合并短时间内到达的片段后再写出；首个片段和含换行的片段立即输出：
+            # 首个片段决定首字延迟，换行通常是段落结束，之后可能要等待工具执行
+            buffer = []
+            buffered_chars = 0
+            first_chunk = True
+            last_flush = time.monotonic()
             for chunk in agent.chat_stream(user_input):
-                print(chunk, end="", flush=True)
-            print()  # 换行
+                buffer.append(chunk)
+                buffered_chars += len(chunk)
+                now = time.monotonic()
+                if (first_chunk or "\n" in chunk or now - last_flush > STREAM_FLUSH_INTERVAL
+                        or buffered_chars > STREAM_FLUSH_CHARS):
+                    sys.stdout.write("".join(buffer))
+                    sys.stdout.flush()
+                    buffer.clear()
+                    buffered_chars = 0
+                    first_chunk = False
+                    last_flush = now
+            if buffer:
+                sys.stdout.write("".join(buffer))
+            sys.stdout.write("\n")  # 换行
+            sys.stdout.flush()
             
         except KeyboardInterrupt:
             print("\n\n检测到中断，正在退出...")
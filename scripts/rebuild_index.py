@@ -1,6 +1,7 @@
 """重建知识库索引的脚本"""
 import sys
 import os
+from operator import itemgetter
 
 # 添加项目根目录到路径
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -39,8 +40,13 @@ def rebuild_index():
     print(f"失败文件: {stats['failed_files']}")
     print(f"总文本块: {stats['total_chunks']}")
     print("\n详细信息:")
-    for detail in stats.get('files_details', []):
-        print(f"  {detail['filename']}: {detail['chunks']} 块, {detail['chars']} 字符")
+    get_detail = itemgetter('filename', 'chunks', 'chars')
+    lines = [
+        f"  {filename}: {chunks} 块, {chars} 字符"
+        for filename, chunks, chars in map(get_detail, stats.get('files_details', []))
+    ]
+    if lines:
+        sys.stdout.write("\n".join(lines) + "\n")
 
 
 if __name__ == "__main__":
@@ -35,14 +35,15 @@ except ImportError:
     print("警告: RAG 知识库模块不可用，相关功能将被禁用")
 
 # 汇总所有工具
-TOOLS = DATA_QUERY_TOOLS + PLS_ANALYSIS_TOOLS + VISUALIZATION_TOOLS + RAG_TOOLS
+TOOLS = [*DATA_QUERY_TOOLS, *PLS_ANALYSIS_TOOLS, *VISUALIZATION_TOOLS, *RAG_TOOLS]
 
 # 汇总所有工具函数映射
-TOOL_FUNCTIONS = {}
-TOOL_FUNCTIONS.update(DATA_QUERY_TOOL_FUNCTIONS)
-TOOL_FUNCTIONS.update(PLS_ANALYSIS_TOOL_FUNCTIONS)
-TOOL_FUNCTIONS.update(VISUALIZATION_TOOL_FUNCTIONS)
-TOOL_FUNCTIONS.update(RAG_TOOL_FUNCTIONS)
+TOOL_FUNCTIONS = (
+    DATA_QUERY_TOOL_FUNCTIONS
+    | PLS_ANALYSIS_TOOL_FUNCTIONS
+    | VISUALIZATION_TOOL_FUNCTIONS
+    | RAG_TOOL_FUNCTIONS
+)
 
 __all__ = [
     'DataQueryTool', 'query_beam_data', 'get_data_info', 
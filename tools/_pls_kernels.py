@@ -0,0 +1,127 @@
+"""
+PLS 统计量计算内核
+逐样本计算 T² 和 SPE 统计量（可同时完成标准化）并汇总；安装了 numba 时使用 JIT 编译的并行实现，否则使用等价的 NumPy 实现
+"""
+
+import functools
+import importlib.util
+
+import numpy as np
+
+# numba 为可选依赖；导入 numba 耗时较长，JIT 内核在首次使用时才导入
+NUMBA_AVAILABLE = importlib.util.find_spec("numba") is not None
+
+# 样本数不超过该值时使用 NumPy 实现：数据量小时并行调度开销抵消 JIT 内核的收益
+NUMBA_MIN_SAMPLES = 2048
+
+# NumPy 实现按行分块计算，每块的中间矩阵可留在 CPU 缓存中
+BLOCK_ROWS = 4096
+
+
+def _t2_spe_numpy(X, mean, scale, R, offset, P, inv_eig):
+    """NumPy 实现，参数与返回值同 t2_spe；按 BLOCK_ROWS 行分块完成标准化、投影和残差计算"""
+    n_samples = X.shape[0]
+    T2 = np.empty(n_samples)
+    SPE = np.empty(n_samples)
+    for start in range(0, n_samples, BLOCK_ROWS):
+        stop = min(start + BLOCK_ROWS, n_samples)
+        Xb = X[start:stop] - mean
+        Xb /= scale
+        T = Xb @ R - offset
+        np.matmul(T * T, inv_eig, out=T2[start:stop])
+        Xb -= T @ P.T
+        np.einsum('ij,ij->i', Xb, Xb, out=SPE[start:stop])
+    return T2, SPE
+
+
+def _summarize_numpy(T2, SPE, ucl_t2, ucl_spe):
+    """NumPy 实现，参数与返回值同 summarize"""
+    # 只分配两个掩码：计数后将 SPE 掩码原地合并到 T² 掩码上得到联合异常
+    anomalies = T2 > ucl_t2
+    count_t2 = np.count_nonzero(anomalies)
+    anomalies_spe = SPE > ucl_spe
+    count_spe = np.count_nonzero(anomalies_spe)
+    np.logical_or(anomalies, anomalies_spe, out=anomalies)
+    count_any = np.count_nonzero(anomalies)
+    first = int(np.argmax(anomalies)) if count_any else -1
+    return (T2.mean().item(), T2.max().item(), T2.min().item(), T2.std().item(),
+            SPE.mean().item(), SPE.max().item(), SPE.min().item(), SPE.std().item(),
+            count_t2, count_spe, count_any, first)
+
+
+@functools.lru_cache(maxsize=None)
+def _numba_kernels():
+    """导入 numba 实现的内核模块，numba 未安装或无法导入时返回 None"""
+    if not NUMBA_AVAILABLE:
+        return None
+    try:
+        from . import _pls_kernels_numba
+    except ImportError:
+        return None
+    return _pls_kernels_numba
+
+
+def warmup():
+    """预先导入并编译（或从磁盘缓存加载）numba 内核，避免首次分析长时间窗口时的编译延迟"""
+    kernels = _numba_kernels()
+    if kernels is None:
+        return
+    X = np.zeros((1, 1))
+    v = np.zeros(1)
+    kernels.t2_spe(X, v, np.ones(1), X, v, X, v)
+    # 数据查询工具缓存的特征矩阵为只读数组，numba 对只读输入单独编译，一并预热
+    X_readonly = np.zeros((1, 1))
+    X_readonly.setflags(write=False)
+    kernels.t2_spe(X_readonly, v, np.ones(1), X, v, X, v)
+    kernels.summarize(v, v, 0.0, 0.0)
+
+
+def t2_spe(X, R, offset, P, inv_eig, mean=None, scale=None):
+    """
+    计算每个样本的 T² 和 SPE 统计量
+
+    先按 Xs = (X - mean) / scale 标准化，再计算得分 T = Xs @ R - offset，
+    T² = Σ T²/λ，SPE = ||Xs - T @ P.T||²
+
+    Args:
+        X: 特征数据，shape 为 (n_samples, n_features)；未提供 mean/scale 时视为已标准化
+        R: 得分投影矩阵，shape 为 (n_features, n_components)
+        offset: 得分偏移量，shape 为 (n_components,)
+        P: 载荷矩阵，shape 为 (n_features, n_components)
+        inv_eig: 各主成分特征值的倒数，shape 为 (n_components,)
+        mean: 标准化均值，shape 为 (n_features,)，默认为 0
+        scale: 标准化缩放系数，shape 为 (n_features,)，默认为 1
+
+    Returns:
+        (T2, SPE) 统计量数组
+    """
+    X = np.ascontiguousarray(X, dtype=np.float64)
+    n_features = X.shape[1]
+    mean = np.zeros(n_features) if mean is None else np.asarray(mean, dtype=np.float64)
+    scale = np.ones(n_features) if scale is None else np.asarray(scale, dtype=np.float64)
+    kernels = _numba_kernels() if X.shape[0] > NUMBA_MIN_SAMPLES else None
+    if kernels is not None:
+        return kernels.t2_spe(X, mean, scale, R, offset, P, inv_eig)
+    return _t2_spe_numpy(X, mean, scale, R, offset, P, inv_eig)
+
+
+def summarize(T2, SPE, ucl_t2, ucl_spe):
+    """
+    汇总 T² 和 SPE 统计量，并定位第一个异常点
+
+    Args:
+        T2: T² 统计量数组（非空）
+        SPE: SPE 统计量数组，长度与 T2 相同
+        ucl_t2: T² 控制限
+        ucl_spe: SPE 控制限
+
+    Returns:
+        (T2 均值, T2 最大值, T2 最小值, T2 标准差,
+         SPE 均值, SPE 最大值, SPE 最小值, SPE 标准差,
+         T² 异常数, SPE 异常数, 异常总数, 第一个异常点下标（无异常时为 -1）)，
+        均为 Python 原生 float/int
+    """
+    kernels = _numba_kernels()
+    if kernels is not None:
+        return kernels.summarize(T2, SPE, float(ucl_t2), float(ucl_spe))
+    return _summarize_numpy(T2, SPE, ucl_t2, ucl_spe)
@@ -0,0 +1,90 @@
+"""
+PLS 统计量计算内核的 numba 实现
+参数与返回值同 _pls_kernels 中的同名函数；由 _pls_kernels 在首次使用时导入，导入本模块即导入 numba
+"""
+
+import numpy as np
+from numba import njit, prange
+
+# 不含 nnan/ninf 的快速数学选项：输入含 NaN 或 inf 时结果与 NumPy 实现一样传播
+_FASTMATH = {'nsz', 'arcp', 'contract', 'afn', 'reassoc'}
+
+
+@njit(cache=True, fastmath=_FASTMATH, parallel=True)
+def t2_spe(X, mean, scale, R, offset, P, inv_eig):
+    """按样本并行，标准化、重构与残差逐元素计算，不生成 (n_samples, n_features) 的中间矩阵"""
+    n_samples, n_features = X.shape
+    n_components = R.shape[1]
+    T = np.empty((n_samples, n_components))
+    T2 = np.empty(n_samples)
+    SPE = np.empty(n_samples)
+    for i in prange(n_samples):
+        for k in range(n_components):
+            T[i, k] = -offset[k]
+        for j in range(n_features):
+            x = (X[i, j] - mean[j]) / scale[j]
+            for k in range(n_components):
+                T[i, k] += x * R[j, k]
+        t2 = 0.0
+        for k in range(n_components):
+            t2 += T[i, k] * T[i, k] * inv_eig[k]
+        spe = 0.0
+        for j in range(n_features):
+            x_hat = 0.0
+            for k in range(n_components):
+                x_hat += T[i, k] * P[j, k]
+            e = (X[i, j] - mean[j]) / scale[j] - x_hat
+            spe += e * e
+        T2[i] = t2
+        SPE[i] = spe
+    return T2, SPE
+
+
+@njit(cache=True)
+def summarize(T2, SPE, ucl_t2, ucl_spe):
+    """一次遍历完成求和、极值、异常计数和首个异常点定位，再一次遍历求方差；极值遇到 NaN 时为 NaN（同 np.max/np.min）"""
+    n = T2.shape[0]
+    sum_t2 = 0.0
+    max_t2 = T2[0]
+    min_t2 = T2[0]
+    sum_spe = 0.0
+    max_spe = SPE[0]
+    min_spe = SPE[0]
+    count_t2 = 0
+    count_spe = 0
+    count_any = 0
+    first = -1
+    for i in range(n):
+        t2 = T2[i]
+        spe = SPE[i]
+        sum_t2 += t2
+        sum_spe += spe
+        if t2 > max_t2 or np.isnan(t2):
+            max_t2 = t2
+        if t2 < min_t2 or np.isnan(t2):
+            min_t2 = t2
+        if spe > max_spe or np.isnan(spe):
+            max_spe = spe
+        if spe < min_spe or np.isnan(spe):
+            min_spe = spe
+        is_t2 = t2 > ucl_t2
+        is_spe = spe > ucl_spe
+        count_t2 += is_t2
+        count_spe += is_spe
+        if is_t2 or is_spe:
+            count_any += 1
+            if first < 0:
+                first = i
+    mean_t2 = sum_t2 / n
+    mean_spe = sum_spe / n
+    # 方差按离差平方和计算（与 np.std 相同的两遍算法），避免 E[x²]-E[x]² 的数值抵消
+    ss_t2 = 0.0
+    ss_spe = 0.0
+    for i in range(n):
+        d = T2[i] - mean_t2
+        ss_t2 += d * d
+        d = SPE[i] - mean_spe
+        ss_spe += d * d
+    return (mean_t2, max_t2, min_t2, np.sqrt(ss_t2 / n),
+            mean_spe, max_spe, min_spe, np.sqrt(ss_spe / n),
+            count_t2, count_spe, count_any, first)
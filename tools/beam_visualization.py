@@ -4,29 +4,124 @@
 """
 
 import os
+import functools
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-from matplotlib.figure import Figure
 from typing import Dict, Any, Optional, Tuple
 from datetime import datetime
 
-# 设置中文字体支持
-plt.rcParams['font.sans-serif'] = ['SimHei', 'Microsoft YaHei', 'Arial Unicode MS']
-plt.rcParams['axes.unicode_minus'] = False
-
 # 导入 PLS 分析工具
 try:
-    from .pls_analysis import PLSAnalysisTool
-    from .data_query import DataQueryTool
+    from .pls_analysis import get_pls_analysis_tool
+    from .data_query import get_data_query_tool
 except ImportError:
     import sys
     current_dir = os.path.dirname(os.path.abspath(__file__))
     parent_dir = os.path.dirname(current_dir)
     if parent_dir not in sys.path:
         sys.path.insert(0, parent_dir)
-    from tools.pls_analysis import PLSAnalysisTool
-    from tools.data_query import DataQueryTool
+    from tools.pls_analysis import get_pls_analysis_tool
+    from tools.data_query import get_data_query_tool
+
+
+# 分析报告模板
+_REPORT_TEMPLATE = """\
+{rule}
+📊 束流波动分析报告
+{rule}
+
+【分析时间范围】
+  起始时间：{start_time}
+  结束时间：{end_time}
+  数据条数：{data_count} 条
+
+【统计指标】
+  T²统计量：
+    - 均值：{T2X_mean:.4f}
+    - 最大值：{T2X_max:.4f}
+    - 最小值：{T2X_min:.4f}
+    - 标准差：{T2X_std:.4f}
+    - 控制上限 (UCL)：{UCL_T2X:.4f}
+
+  SPE统计量：
+    - 均值：{SPEX_mean:.4f}
+    - 最大值：{SPEX_max:.4f}
+    - 最小值：{SPEX_min:.4f}
+    - 标准差：{SPEX_std:.4f}
+    - 控制上限 (UCL)：{UCL_SPEX:.4f}
+
+【异常检测结果】
+  状态：{status_emoji} {status}
+  总样本数：{total_samples} 个
+  异常点数：{anomaly_count} 个
+  异常率：{anomaly_rate:.2%}
+  T²异常数：{T2X_anomaly_count} 个
+  SPE异常数：{SPEX_anomaly_count} 个
+
+【分析结论】
+{conclusion}
+
+{rule}"""
+
+_NORMAL_CONCLUSION = """\
+  ✓ 该时间段内束流运行状况良好，所有数据点均在正常范围内。
+  ✓ T²统计量和SPE统计量均未超出控制上限。
+  ✓ 未检测到显著的异常波动。"""
+
+_ANOMALY_CONCLUSION = """\
+  ⚠ 该时间段内检测到 {anomaly_count} 个异常点。
+  ⚠ 异常率为 {anomaly_rate:.2%}，需要关注。"""
+
+_FIRST_ANOMALY_TEMPLATE = """
+
+【首个异常点详情】
+  时间：{time}
+  位置：第 {position} 个数据点
+  T²值：{T2X_value:.4f} (阈值: {UCL_T2X:.4f})
+  SPE值：{SPEX_value:.4f} (阈值: {UCL_SPEX:.4f})"""
+
+
+@functools.lru_cache(maxsize=None)
+def _setup_matplotlib():
+    """按需导入 matplotlib（仅在绘图时加载）并设置中文字体支持"""
+    import matplotlib
+    matplotlib.rcParams['font.sans-serif'] = ['SimHei', 'Microsoft YaHei', 'Arial Unicode MS']
+    matplotlib.rcParams['axes.unicode_minus'] = False
+
+
+# 曲线绘制的最大点数，超过时按桶降采样
+PLOT_MAX_POINTS = 5000
+
+
+def _downsample_indices(y: np.ndarray, n_out: int = PLOT_MAX_POINTS) -> np.ndarray:
+    """
+    计算曲线降采样后保留的样本索引
+    
+    将序列均分为 n_out/2 个桶，每个桶保留最小值和最大值所在的点，
+    峰值和谷值不会因降采样而丢失。
+    
+    Args:
+        y: 曲线数据
+        n_out: 最多保留的点数
+    
+    Returns:
+        按时间顺序排列的样本索引数组
+    """
+    n = len(y)
+    if n <= n_out:
+        return np.arange(n)
+    
+    n_buckets = max(n_out // 2, 1)
+    bucket_size = -(-n // n_buckets)  # 向上取整
+    # 末尾用最后一个值补齐，使序列可整形为 (n_buckets, bucket_size)
+    padded = np.pad(y, (0, n_buckets * bucket_size - n), mode='edge').reshape(n_buckets, bucket_size)
+    offsets = np.arange(n_buckets) * bucket_size
+    idx = np.concatenate([
+        offsets + padded.argmin(axis=1),
+        offsets + padded.argmax(axis=1),
+        [0, n - 1]
+    ])
+    return np.unique(np.minimum(idx, n - 1))
 
 
 class BeamVisualizationTool:
@@ -40,7 +135,8 @@ class BeamVisualizationTool:
             model_path: PLS 模型文件路径
             data_path: CSV数据文件路径
         """
-        self.pls_tool = PLSAnalysisTool(model_path=model_path, data_path=data_path)
+        # 复用已加载的 PLS 模型
+        self.pls_tool = get_pls_analysis_tool(model_path=model_path, data_path=data_path)
         self.data_path = self.pls_tool.data_path
     
     def format_analysis_result(self, analysis_result: Dict[str, Any]) -> str:
@@ -56,90 +152,58 @@ class BeamVisualizationTool:
         if not analysis_result.get('success', False):
             return f"❌ 分析失败：{analysis_result.get('message', '未知错误')}"
         
-        lines = []
-        lines.append("=" * 70)
-        lines.append("📊 束流波动分析报告")
-        lines.append("=" * 70)
-        
-        # 1. 基本信息
-        lines.append("\n【分析时间范围】")
-        lines.append(f"  起始时间：{analysis_result['start_time']}")
-        lines.append(f"  结束时间：{analysis_result['end_time']}")
-        lines.append(f"  数据条数：{analysis_result['data_count']} 条")
-        
-        # 2. 统计信息
-        lines.append("\n【统计指标】")
         stats = analysis_result['statistics']
         thresholds = analysis_result['thresholds']
-        
-        lines.append(f"  T²统计量：")
-        lines.append(f"    - 均值：{stats['T2X_mean']:.4f}")
-        lines.append(f"    - 最大值：{stats['T2X_max']:.4f}")
-        lines.append(f"    - 最小值：{stats['T2X_min']:.4f}")
-        lines.append(f"    - 标准差：{stats['T2X_std']:.4f}")
-        lines.append(f"    - 控制上限 (UCL)：{thresholds['UCL_T2X']:.4f}")
-        
-        lines.append(f"\n  SPE统计量：")
-        lines.append(f"    - 均值：{stats['SPEX_mean']:.4f}")
-        lines.append(f"    - 最大值：{stats['SPEX_max']:.4f}")
-        lines.append(f"    - 最小值：{stats['SPEX_min']:.4f}")
-        lines.append(f"    - 标准差：{stats['SPEX_std']:.4f}")
-        lines.append(f"    - 控制上限 (UCL)：{thresholds['UCL_SPEX']:.4f}")
-        
-        # 3. 异常检测结果
-        lines.append("\n【异常检测结果】")
         anomaly = analysis_result['anomaly_detection']
         summary = analysis_result['summary']
         
-        status_emoji = "✅" if not summary['has_anomaly'] else "⚠️"
-        lines.append(f"  状态：{status_emoji} {summary['status']}")
-        lines.append(f"  总样本数：{anomaly['total_samples']} 个")
-        lines.append(f"  异常点数：{anomaly['anomaly_count']} 个")
-        lines.append(f"  异常率：{anomaly['anomaly_rate']:.2%}")
-        lines.append(f"  T²异常数：{anomaly['T2X_anomaly_count']} 个")
-        lines.append(f"  SPE异常数：{anomaly['SPEX_anomaly_count']} 个")
-        
-        # 4. 结论性描述
-        lines.append("\n【分析结论】")
+        # 结论性描述
         if not summary['has_anomaly']:
-            lines.append("  ✓ 该时间段内束流运行状况良好，所有数据点均在正常范围内。")
-            lines.append("  ✓ T²统计量和SPE统计量均未超出控制上限。")
-            lines.append("  ✓ 未检测到显著的异常波动。")
+            conclusion = _NORMAL_CONCLUSION
         else:
-            lines.append(f"  ⚠ 该时间段内检测到 {anomaly['anomaly_count']} 个异常点。")
-            lines.append(f"  ⚠ 异常率为 {anomaly['anomaly_rate']:.2%}，需要关注。")
+            conclusion = _ANOMALY_CONCLUSION.format_map(anomaly)
             
             # 详细分析第一个异常点
             first_anomaly = anomaly.get('first_anomaly')
             if first_anomaly:
-                lines.append("\n【首个异常点详情】")
-                lines.append(f"  时间：{first_anomaly['time']}")
-                lines.append(f"  位置：第 {first_anomaly['index'] + 1} 个数据点")
-                lines.append(f"  T²值：{first_anomaly['T2X_value']:.4f} (阈值: {thresholds['UCL_T2X']:.4f})")
-                lines.append(f"  SPE值：{first_anomaly['SPEX_value']:.4f} (阈值: {thresholds['UCL_SPEX']:.4f})")
+                conclusion += _FIRST_ANOMALY_TEMPLATE.format_map({
+                    **first_anomaly,
+                    **thresholds,
+                    'position': first_anomaly['index'] + 1
+                })
                 
-                # T² 贡献度分析
-                if first_anomaly.get('T2X_anomaly') and 'T2X_top_features' in first_anomaly:
-                    lines.append("\n  T²异常主要贡献特征：")
-                    for i, (feature, contrib) in enumerate(first_anomaly['T2X_top_features'].items(), 1):
-                        lines.append(f"    {i}. {feature}: {contrib:.6f}")
-                
-                # SPE 贡献度分析
-                if first_anomaly.get('SPEX_anomaly') and 'SPEX_top_features' in first_anomaly:
-                    lines.append("\n  SPE异常主要贡献特征：")
-                    for i, (feature, contrib) in enumerate(first_anomaly['SPEX_top_features'].items(), 1):
-                        lines.append(f"    {i}. {feature}: {contrib:.6f}")
-        
-        lines.append("\n" + "=" * 70)
+                # T² / SPE 贡献度分析
+                for prefix, title in (('T2X', 'T²'), ('SPEX', 'SPE')):
+                    top_features = first_anomaly.get(f'{prefix}_top_features')
+                    if first_anomaly.get(f'{prefix}_anomaly') and top_features is not None:
+                        conclusion += f"\n\n  {title}异常主要贡献特征：" + "".join(
+                            f"\n    {i}. {feature}: {contrib:.6f}"
+                            for i, (feature, contrib) in enumerate(top_features.items(), 1)
+                        )
         
-        return "\n".join(lines)
+        return _REPORT_TEMPLATE.format_map({
+            **stats,
+            **thresholds,
+            **anomaly,
+            'start_time': analysis_result['start_time'],
+            'end_time': analysis_result['end_time'],
+            'data_count': analysis_result['data_count'],
+            'status': summary['status'],
+            'status_emoji': "✅" if not summary['has_anomaly'] else "⚠️",
+            'rule': "=" * 70,
+            'conclusion': conclusion
+        })
     
     def plot_analysis_result(
         self,
         start_time: str,
         end_time: str,
         save_path: Optional[str] = None,
-        figsize: Tuple[int, int] = (14, 10)
+        figsize: Tuple[int, int] = (14, 10),
+        dpi: int = 100,
+        t2: Optional[np.ndarray] = None,
+        spe: Optional[np.ndarray] = None,
+        time_points: Optional[np.ndarray] = None
     ) -> Optional[str]:
         """
         绘制分析结果的可视化图表
@@ -149,55 +213,68 @@ class BeamVisualizationTool:
             end_time: 结束时间
             save_path: 图表保存路径，如果为 None 则显示图表
             figsize: 图表大小
+            dpi: 保存图片的分辨率
+            t2: 已计算的 T² 统计量（可选），与 spe、time_points 同时提供时不再重新查询和计算
+            spe: 已计算的 SPE 统计量（可选）
+            time_points: 与统计量对应的时间点（可选）
         
         Returns:
             保存的文件路径，如果只是显示则返回 None
         """
         try:
-            # 1. 获取数据和计算统计量
-            query_tool = DataQueryTool(data_path=self.data_path)
-            query_tool.df['时间'] = pd.to_datetime(query_tool.df['时间'])
-            
-            start_dt = pd.to_datetime(start_time)
-            end_dt = pd.to_datetime(end_time)
-            mask = (query_tool.df['时间'] >= start_dt) & (query_tool.df['时间'] <= end_dt)
-            data_df = query_tool.df[mask].copy()
+            # 1. 获取数据和计算统计量（已提供统计量时直接绘图）
+            if t2 is not None and spe is not None and time_points is not None:
+                T2X, SPEX = np.asarray(t2), np.asarray(spe)
+                time_points = np.asarray(time_points)
+            else:
+                query_tool = get_data_query_tool(self.data_path)
+                # 时间列在加载数据时已转换为 datetime 类型
+                assert pd.api.types.is_datetime64_any_dtype(query_tool.df['时间'])
+                
+                start_dt = pd.to_datetime(start_time)
+                end_dt = pd.to_datetime(end_time)
+                lo, hi = query_tool.locate_time_range(start_dt, end_dt)
+                
+                # 提取特征数据（直接切片加载时缓存的特征矩阵），标准化与统计量计算合并完成
+                # （绘图只需要 T² 和 SPE，不保留残差矩阵）
+                X_data = query_tool.feature_matrix[lo:hi]
+                T2X, SPEX = self.pls_tool.project_raw(X_data)
+                time_points = query_tool.time_index[lo:hi]
             
-            if len(data_df) == 0:
+            if len(T2X) == 0:
                 print(f"警告：在 {start_time} 到 {end_time} 范围内未找到数据")
                 return None
             
-            # 提取特征数据
-            feature_cols = [col for col in data_df.columns if col.startswith('feature')]
-            feature_cols.sort(key=lambda x: int(x.replace('feature', '')))
-            X_data = data_df[feature_cols].values
-            
-            # 标准化
-            X_scaled = self.pls_tool.scaler_X.transform(X_data)
-            
-            # 计算统计量
-            T2X, SPEX, E_X = self.pls_tool._compute_pls_stats(X_scaled)
-            
-            # 检测异常
-            anomalies_T2X = T2X > self.pls_tool.UCL_T2X
+            # 检测异常：散点只需异常点下标；联合异常原地合并到 T² 掩码上，不再分配新数组
+            anomalies_combined = T2X > self.pls_tool.UCL_T2X
             anomalies_SPEX = SPEX > self.pls_tool.UCL_SPEX
-            anomalies_combined = anomalies_T2X | anomalies_SPEX
+            idx_anomaly_T2X = np.flatnonzero(anomalies_combined)
+            idx_anomaly_SPEX = np.flatnonzero(anomalies_SPEX)
+            np.logical_or(anomalies_combined, anomalies_SPEX, out=anomalies_combined)
             
             # 2. 创建图表
-            fig, axes = plt.subplots(2, 1, figsize=figsize)
+            _setup_matplotlib()
+            # 保存到文件时直接使用 Figure（Agg 渲染），不经过 pyplot 和 GUI 后端
+            if save_path:
+                from matplotlib.figure import Figure
+                fig = Figure(figsize=figsize)
+                axes = fig.subplots(2, 1)
+            else:
+                import matplotlib.pyplot as plt
+                fig, axes = plt.subplots(2, 1, figsize=figsize)
             fig.suptitle('束流波动 PLS 分析结果', fontsize=16, fontweight='bold')
             
-            time_points = data_df['时间'].values
-            
             # 绘制 T² 图
             ax1 = axes[0]
-            ax1.plot(time_points, T2X, 'b-', linewidth=1, label='T² 统计量', alpha=0.7)
+            # 曲线按桶降采样后绘制，异常点始终全部标注
+            idx_T2X = _downsample_indices(T2X)
+            ax1.plot(time_points[idx_T2X], T2X[idx_T2X], 'b-', linewidth=1, label='T² 统计量', alpha=0.7)
             ax1.axhline(y=self.pls_tool.UCL_T2X, color='r', linestyle='--', 
                        linewidth=2, label=f'UCL = {self.pls_tool.UCL_T2X:.2f}')
             
             # 标注 T² 异常点
-            if np.any(anomalies_T2X):
-                ax1.scatter(time_points[anomalies_T2X], T2X[anomalies_T2X], 
+            if idx_anomaly_T2X.size:
+                ax1.scatter(time_points[idx_anomaly_T2X], T2X[idx_anomaly_T2X], 
                            color='red', s=50, marker='o', label='异常点', zorder=5)
             
             ax1.set_ylabel('T² 统计量', fontsize=12)
@@ -208,13 +285,14 @@ class BeamVisualizationTool:
             
             # 绘制 SPE 图
             ax2 = axes[1]
-            ax2.plot(time_points, SPEX, 'g-', linewidth=1, label='SPE 统计量', alpha=0.7)
+            idx_SPEX = _downsample_indices(SPEX)
+            ax2.plot(time_points[idx_SPEX], SPEX[idx_SPEX], 'g-', linewidth=1, label='SPE 统计量', alpha=0.7)
             ax2.axhline(y=self.pls_tool.UCL_SPEX, color='r', linestyle='--', 
                        linewidth=2, label=f'UCL = {self.pls_tool.UCL_SPEX:.2f}')
             
             # 标注 SPE 异常点
-            if np.any(anomalies_SPEX):
-                ax2.scatter(time_points[anomalies_SPEX], SPEX[anomalies_SPEX], 
+            if idx_anomaly_SPEX.size:
+                ax2.scatter(time_points[idx_anomaly_SPEX], SPEX[idx_anomaly_SPEX], 
                            color='red', s=50, marker='o', label='异常点', zorder=5)
             
             ax2.set_xlabel('时间', fontsize=12)
@@ -225,7 +303,7 @@ class BeamVisualizationTool:
             ax2.tick_params(axis='x', rotation=45)
             
             # 添加统计信息文本框
-            anomaly_count = np.sum(anomalies_combined)
+            anomaly_count = np.count_nonzero(anomalies_combined)
             anomaly_rate = anomaly_count / len(T2X) if len(T2X) > 0 else 0
             info_text = f'样本数: {len(T2X)}\n异常数: {anomaly_count}\n异常率: {anomaly_rate:.2%}'
             
@@ -235,13 +313,12 @@ class BeamVisualizationTool:
                     verticalalignment='top',
                     bbox=dict(boxstyle='round', facecolor='wheat', alpha=0.5))
             
-            plt.tight_layout(rect=[0, 0, 1, 0.96])
+            fig.tight_layout(rect=[0, 0, 1, 0.96])
             
             # 3. 保存或显示
             if save_path:
-                plt.savefig(save_path, dpi=300, bbox_inches='tight')
+                fig.savefig(save_path, dpi=dpi, bbox_inches='tight')
                 print(f"图表已保存至: {save_path}")
-                plt.close(fig)
                 return save_path
             else:
                 plt.show()
@@ -320,9 +397,10 @@ def visualize_beam_fluctuation(
         - raw_result: 原始分析结果
     """
     try:
-        # 1. 执行 PLS 分析
-        tool = PLSAnalysisTool()
-        analysis_result = tool.analyze_fluctuation(start_time, end_time)
+        # 1. 执行 PLS 分析（同时取回 T²/SPE 序列，绘图时不再重复计算）
+        viz_tool = BeamVisualizationTool()
+        analysis_result = viz_tool.pls_tool.analyze_fluctuation(start_time, end_time, return_arrays=True)
+        arrays = analysis_result.pop('_arrays', None) or {}
         
         if not analysis_result.get('success', False):
             return {
@@ -335,7 +413,6 @@ def visualize_beam_fluctuation(
             }
         
         # 2. 生成自然语言报告
-        viz_tool = BeamVisualizationTool()
         text_report = viz_tool.format_analysis_result(analysis_result)
         
         # 3. 生成可视化图表
@@ -351,7 +428,10 @@ def visualize_beam_fluctuation(
                 timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
                 save_path = os.path.join(output_dir, f'beam_analysis_{timestamp}.png')
             
-            plot_path = viz_tool.plot_analysis_result(start_time, end_time, save_path=save_path)
+            plot_path = viz_tool.plot_analysis_result(
+                start_time, end_time, save_path=save_path,
+                t2=arrays.get('T2X'), spe=arrays.get('SPEX'), time_points=arrays.get('time')
+            )
         
         return {
             "success": True,
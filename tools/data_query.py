@@ -3,10 +3,48 @@
 提供从CSV文件中查询束流数据的功能
 """
 
+import numpy as np
 import pandas as pd
 from datetime import datetime
 from typing import Optional, Dict, Any
+import functools
+import importlib.util
 import os
+import tempfile
+import time
+import uuid
+
+
+# pyarrow 为可选依赖，安装后使用其多线程 CSV 解析器
+_PYARROW_AVAILABLE = importlib.util.find_spec("pyarrow") is not None
+
+# target 列统计指标（顺序即返回结果中的键顺序）
+_STAT_NAMES = ['mean', 'max', 'min', 'std']
+
+# 查询结果导出目录（项目根目录下的 output/）
+_OUTPUT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'output')
+
+# 导出文件名前缀和保留时长（秒），超过保留时长的导出文件在下次导出时删除
+_EXPORT_PREFIX = 'query_'
+_EXPORT_MAX_AGE = 24 * 3600
+
+
+def _make_temp_path(path: str) -> str:
+    """
+    在目标文件所在目录创建唯一命名的临时文件
+    
+    多个线程或进程同时生成同一缓存文件时各自写入不同的临时文件，再原子替换目标文件。
+    
+    Args:
+        path: 目标文件路径
+    
+    Returns:
+        临时文件路径
+    """
+    directory, name = os.path.split(path)
+    fd, tmp_path = tempfile.mkstemp(prefix=name + '.', suffix='.tmp', dir=directory or None)
+    os.close(fd)
+    return tmp_path
 
 
 class DataQueryTool:
@@ -21,6 +59,10 @@ class DataQueryTool:
         """
         self.data_path = data_path
         self.df = None
+        self.feature_cols = []
+        # 按时间排序后的时间列（datetime64[ns]）和特征矩阵，均为只读，可按 locate_time_range 的行区间切片
+        self.time_index = None
+        self.feature_matrix = None
         self._load_data()
     
     def _load_data(self):
@@ -28,16 +70,150 @@ class DataQueryTool:
         if not os.path.exists(self.data_path):
             raise FileNotFoundError(f"数据文件不存在: {self.data_path}")
         
-        self.df = pd.read_csv(self.data_path)
-        # 将时间列转换为datetime类型
-        self.df['时间'] = pd.to_datetime(self.df['时间'])
+        # 优先读取 Parquet 缓存文件，不存在或已过期时解析 CSV 并生成缓存
+        df = self._read_sidecar()
+        from_csv = df is None
+        if from_csv:
+            df = self._read_csv()
+        
+        # 按时间排序，之后按时间范围查询可直接二分定位
+        if not df['时间'].is_monotonic_increasing:
+            df = df.sort_values('时间', kind='mergesort', ignore_index=True)
+        self.df = df
+        # 缓存的数组在多次请求间共享，设为只读，防止调用方原地修改
+        self.time_index = df['时间'].to_numpy()
+        self.time_index.setflags(write=False)
+        
+        # 特征列（feature1 到 featureN，按数字排序）及其数值矩阵，供 PLS 分析直接切片使用
+        self.feature_cols = sorted(
+            (col for col in df.columns if col.startswith('feature')),
+            key=lambda x: int(x[len('feature'):])
+        )
+        self.feature_matrix = self._load_feature_matrix()
+        self.feature_matrix.setflags(write=False)
+        
+        if from_csv:
+            self._write_sidecar()
         print(f"数据加载成功，共 {len(self.df)} 条记录")
     
+    @property
+    def sidecar_path(self) -> str:
+        """与CSV同名的 Parquet 缓存文件路径"""
+        return os.path.splitext(self.data_path)[0] + '.parquet'
+    
+    def _read_sidecar(self) -> Optional[pd.DataFrame]:
+        """读取 Parquet 缓存文件，缓存不可用或比CSV旧时返回 None"""
+        sidecar = self.sidecar_path
+        if not _PYARROW_AVAILABLE or not os.path.exists(sidecar):
+            return None
+        if os.path.getmtime(sidecar) < os.path.getmtime(self.data_path):
+            return None
+        try:
+            return pd.read_parquet(sidecar, engine='pyarrow')
+        except Exception as e:
+            print(f"读取缓存文件失败，改为解析CSV: {e}")
+            return None
+    
+    def _write_sidecar(self):
+        """将解析后的数据写入 Parquet 缓存文件（失败不影响使用）"""
+        if not _PYARROW_AVAILABLE:
+            return
+        sidecar = self.sidecar_path
+        tmp_path = None
+        try:
+            tmp_path = _make_temp_path(sidecar)
+            self.df.to_parquet(tmp_path, engine='pyarrow', compression='zstd', index=False)
+            os.replace(tmp_path, sidecar)
+        except Exception as e:
+            print(f"写入缓存文件失败: {e}")
+            if tmp_path is not None and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+    
+    @property
+    def features_path(self) -> str:
+        """与CSV同名的特征矩阵缓存文件路径（.npy）"""
+        return os.path.splitext(self.data_path)[0] + '.features.npy'
+    
+    def _load_feature_matrix(self) -> np.ndarray:
+        """
+        加载特征矩阵
+        
+        优先以只读内存映射方式打开 .npy 缓存文件，多个进程可共享操作系统页缓存；
+        缓存不存在、比CSV旧、形状不符或不是行优先（C 顺序）存储时，从 DataFrame 生成并写入缓存。
+        
+        Returns:
+            行优先的 float64 特征矩阵，shape 为 (n_samples, n_features)，列顺序与 feature_cols 一致
+        """
+        path = self.features_path
+        expected_shape = (len(self.df), len(self.feature_cols))
+        if os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(self.data_path):
+            try:
+                matrix = np.load(path, mmap_mode='r')
+                if (matrix.shape == expected_shape and matrix.dtype == np.float64
+                        and matrix.flags.c_contiguous):
+                    return matrix
+            except Exception as e:
+                print(f"读取特征矩阵缓存失败，改为重新生成: {e}")
+        
+        # 特征列类型不一（float64 与 int64 混合）时 to_numpy 返回列优先数组，需转为行优先，
+        # 使按时间取出的行切片是连续内存，计算内核无需再复制
+        matrix = np.ascontiguousarray(self.df[self.feature_cols].to_numpy(dtype=np.float64))
+        tmp_path = None
+        try:
+            tmp_path = _make_temp_path(path)
+            with open(tmp_path, 'wb') as f:
+                np.save(f, matrix)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            print(f"写入特征矩阵缓存失败: {e}")
+            if tmp_path is not None and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return matrix
+    
+    def _read_csv(self) -> pd.DataFrame:
+        """读取CSV并在解析时直接将时间列转换为datetime类型"""
+        df = None
+        if _PYARROW_AVAILABLE:
+            try:
+                df = pd.read_csv(self.data_path, engine='pyarrow', parse_dates=['时间'])
+            except (ImportError, ValueError):
+                df = None
+        if df is None:
+            df = pd.read_csv(self.data_path, parse_dates=['时间'])
+        
+        # 无法按格式推断时回退到逐个解析，并统一为纳秒精度
+        if not pd.api.types.is_datetime64_any_dtype(df['时间']):
+            df['时间'] = pd.to_datetime(df['时间'])
+        if df['时间'].dtype != 'datetime64[ns]':
+            df['时间'] = df['时间'].astype('datetime64[ns]')
+        return df
+    
+    def locate_time_range(self, start_dt: pd.Timestamp, end_dt: pd.Timestamp) -> tuple:
+        """
+        定位时间范围在数据中的行位置
+        
+        数据中的时间不带时区，带时区的查询时间无法与之比较，抛出 ValueError。
+        
+        Args:
+            start_dt: 开始时间（不带时区）
+            end_dt: 结束时间（不带时区）
+        
+        Returns:
+            (lo, hi) 行位置区间，self.df.iloc[lo:hi] 即为 [start_dt, end_dt] 内的数据
+        """
+        # to_datetime64 会将带时区的时间换算为 UTC，直接比较会得到错位的时间窗口
+        if start_dt.tzinfo is not None or end_dt.tzinfo is not None:
+            raise ValueError(f"不支持带时区的时间: {start_dt} 到 {end_dt}，数据中的时间不带时区")
+        lo = np.searchsorted(self.time_index, start_dt.to_datetime64(), side='left')
+        hi = np.searchsorted(self.time_index, end_dt.to_datetime64(), side='right')
+        return int(lo), int(hi)
+    
     def query_by_time_range(
         self,
         start_time: str,
         end_time: str,
-        columns: Optional[list] = None
+        columns: Optional[list] = None,
+        max_rows: Optional[int] = None
     ) -> Dict[str, Any]:
         """
         根据时间范围查询数据
@@ -46,6 +222,9 @@ class DataQueryTool:
             start_time: 开始时间，格式如 "2025-08-31 02:00:00" 或 "2025-08-31T02:00:00"
             end_time: 结束时间，格式如 "2025-08-31 03:00:00" 或 "2025-08-31T03:00:00"
             columns: 需要返回的列名列表，默认返回所有列
+            max_rows: 直接返回的最大记录条数。不指定时只返回前 5 条预览；
+                结果不超过该条数时全部返回，超过时将完整结果导出到 output/ 目录（保留 24 小时），
+                返回文件路径（data_uri）和前 5 条预览（head）
         
         Returns:
             包含查询结果的字典，包括数据、统计信息等
@@ -56,8 +235,8 @@ class DataQueryTool:
             end_dt = pd.to_datetime(end_time)
             
             # 查询数据
-            mask = (self.df['时间'] >= start_dt) & (self.df['时间'] <= end_dt)
-            result_df = self.df[mask]
+            lo, hi = self.locate_time_range(start_dt, end_dt)
+            result_df = self.df.iloc[lo:hi]
             
             # 选择特定列
             if columns:
@@ -66,26 +245,38 @@ class DataQueryTool:
                     result_df = result_df[available_columns]
             
             
+            # 统计 target 列
+            if 'target' in result_df.columns:
+                target_stats = self._describe(result_df['target'])
+            else:
+                target_stats = dict.fromkeys(_STAT_NAMES)
+            
             # 构建返回结果
-            # 先将时间列转换为字符串
-            result_df_copy = result_df.copy()
-            if '时间' in result_df_copy.columns:
-                result_df_copy['时间'] = result_df_copy['时间'].dt.strftime('%Y-%m-%d %H:%M:%S')
+            # 默认只返回前几条记录；结果超过 max_rows 时导出到文件，不在返回值中展开
+            data_uri = None
+            if max_rows is None:
+                data = self._to_records(result_df.head())
+            elif len(result_df) <= max_rows:
+                data = self._to_records(result_df)
+            else:
+                data = None
+                data_uri = self._export_rows(result_df)
 
-            return {
+            result = {
                 "success": True,
                 "count": len(result_df),
                 "start_time": start_time,
                 "end_time": end_time,
-                "data": result_df_copy.head().to_dict('records'),  # 使用转换后的副本
+                "data": data,
                 "statistics": {
-                    "target_mean": float(result_df['target'].mean()) if 'target' in result_df.columns else None,
-                    "target_max": float(result_df['target'].max()) if 'target' in result_df.columns else None,
-                    "target_min": float(result_df['target'].min()) if 'target' in result_df.columns else None,
-                    "target_std": float(result_df['target'].std()) if 'target' in result_df.columns else None,
+                    f"target_{name}": value for name, value in target_stats.items()
                 },
                 "columns": list(result_df.columns)
             }
+            if data_uri is not None:
+                result["data_uri"] = data_uri
+                result["head"] = self._to_records(result_df.head())
+            return result
         except Exception as e:
             return {
                 "success": False,
@@ -93,6 +284,57 @@ class DataQueryTool:
                 "message": f"查询失败: {str(e)}"
             }
     
+    @staticmethod
+    def _to_records(df: pd.DataFrame) -> list:
+        """将数据转换为记录列表，时间列转换为字符串"""
+        if '时间' in df.columns:
+            df = df.assign(**{'时间': df['时间'].dt.strftime('%Y-%m-%d %H:%M:%S')})
+        return df.to_dict('records')
+
+    @staticmethod
+    def _export_rows(df: pd.DataFrame) -> str:
+        """
+        将查询结果导出到 output/ 目录
+        
+        安装了 pyarrow 时导出为 parquet，否则导出为 CSV。导出前删除超过保留时长的旧导出文件。
+        
+        Args:
+            df: 查询结果
+        
+        Returns:
+            导出文件路径
+        """
+        os.makedirs(_OUTPUT_DIR, exist_ok=True)
+        DataQueryTool._remove_expired_exports()
+        name = f"{_EXPORT_PREFIX}{uuid.uuid4().hex}"
+        if _PYARROW_AVAILABLE:
+            path = os.path.join(_OUTPUT_DIR, name + '.parquet')
+            df.to_parquet(path, compression='zstd', index=False)
+        else:
+            path = os.path.join(_OUTPUT_DIR, name + '.csv')
+            df.to_csv(path, index=False, encoding='utf-8-sig')
+        return path
+
+    @staticmethod
+    def _remove_expired_exports():
+        """删除 output/ 目录中超过保留时长的查询导出文件（删除失败不影响导出）"""
+        expire_before = time.time() - _EXPORT_MAX_AGE
+        with os.scandir(_OUTPUT_DIR) as entries:
+            for entry in entries:
+                if not entry.name.startswith(_EXPORT_PREFIX) or not entry.is_file():
+                    continue
+                try:
+                    if entry.stat().st_mtime < expire_before:
+                        os.remove(entry.path)
+                except OSError:
+                    # 文件可能已被其他进程删除
+                    pass
+
+    @staticmethod
+    def _describe(series: pd.Series) -> Dict[str, float]:
+        """一次聚合计算序列的均值、最大值、最小值和标准差"""
+        return {name: float(value) for name, value in series.agg(_STAT_NAMES).items()}
+    
     def get_data_summary(self) -> Dict[str, Any]:
         """
         获取数据集的概要信息
@@ -107,17 +349,37 @@ class DataQueryTool:
                 "start": str(self.df['时间'].min()),
                 "end": str(self.df['时间'].max())
             },
-            "target_stats": {
-                "mean": float(self.df['target'].mean()),
-                "max": float(self.df['target'].max()),
-                "min": float(self.df['target'].min()),
-                "std": float(self.df['target'].std())
-            }
+            "target_stats": self._describe(self.df['target'])
         }
 
 
+@functools.lru_cache(maxsize=4)
+def _get_tool(data_path: str, mtime: float) -> DataQueryTool:
+    """按数据路径和文件修改时间缓存 DataQueryTool 实例"""
+    return DataQueryTool(data_path=data_path)
+
+
+def get_data_query_tool(data_path: str = "data/束流.csv") -> DataQueryTool:
+    """
+    获取共享的 DataQueryTool 实例
+    
+    同一数据文件只读取和解析一次；文件被修改后（修改时间变化）自动重新加载。
+    调用方不应修改返回实例的 df。
+    
+    Args:
+        data_path: CSV数据文件路径
+    
+    Returns:
+        DataQueryTool 实例
+    """
+    data_path = os.path.abspath(data_path)
+    if not os.path.exists(data_path):
+        raise FileNotFoundError(f"数据文件不存在: {data_path}")
+    return _get_tool(data_path, os.path.getmtime(data_path))
+
+
 # 定义供LLM调用的工具函数
-def query_beam_data(start_time: str, end_time: str, columns: list = None) -> Dict[str, Any]:
+def query_beam_data(start_time: str, end_time: str, columns: list = None, max_rows: int = None) -> Dict[str, Any]:
     """
     查询指定时间范围内的束流数据
     
@@ -125,12 +387,13 @@ def query_beam_data(start_time: str, end_time: str, columns: list = None) -> Dic
         start_time: 开始时间，格式如 "2025-08-31 02:00:00" 或 "2025-08-31T02:00:00"
         end_time: 结束时间，格式如 "2025-08-31 03:00:00" 或 "2025-08-31T03:00:00"
         columns: 需要返回的列名列表，默认返回所有列
+        max_rows: 直接返回的最大记录条数，超过时导出到文件，默认只返回前 5 条预览
     
     Returns:
         包含查询结果的字典
     """
-    tool = DataQueryTool()
-    return tool.query_by_time_range(start_time, end_time, columns)
+    tool = get_data_query_tool()
+    return tool.query_by_time_range(start_time, end_time, columns, max_rows)
 
 
 def get_data_info() -> Dict[str, Any]:
@@ -140,7 +403,7 @@ def get_data_info() -> Dict[str, Any]:
     Returns:
         数据集概要信息字典
     """
-    tool = DataQueryTool()
+    tool = get_data_query_tool()
     return tool.get_data_summary()
 
 
@@ -166,6 +429,10 @@ DATA_QUERY_TOOLS = [
                         "type": "array",
                         "items": {"type": "string"},
                         "description": "需要返回的列名列表，例如 ['时间', 'target', 'feature1']。如果不指定，则返回所有列。"
+                    },
+                    "max_rows": {
+                        "type": "integer",
+                        "description": "需要完整记录时指定的最大返回条数，例如 1000。结果不超过该条数时全部返回；超过时完整结果导出到文件，只返回文件路径（data_uri）和前 5 条预览（head）。不指定时只返回前 5 条预览。"
                     }
                 },
                 "required": ["start_time", "end_time"]
@@ -4,14 +4,16 @@ PLS 波动分析工具模块
 """
 
 import os
-import joblib
+import copy
+import functools
 import numpy as np
 import pandas as pd
 from typing import Dict, Any, Optional
 
-# 导入 DataQueryTool，使用相对导入避免循环依赖
+# 导入数据查询工具，使用相对导入避免循环依赖
 try:
-    from .data_query import DataQueryTool
+    from .data_query import get_data_query_tool
+    from ._pls_kernels import t2_spe, summarize, warmup as _warmup_kernels
 except ImportError:
     # 如果相对导入失败，尝试绝对导入
     import sys
@@ -20,7 +22,36 @@ except ImportError:
     parent_dir = os.path.dirname(current_dir)
     if parent_dir not in sys.path:
         sys.path.insert(0, parent_dir)
-    from tools.data_query import DataQueryTool
+    from tools.data_query import get_data_query_tool
+    from tools._pls_kernels import t2_spe, summarize, warmup as _warmup_kernels
+
+
+# 默认模型与数据路径（相对项目根目录）
+_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_MODEL_PATH = os.path.join(_PROJECT_ROOT, "models", "pls_model.pkl")
+DEFAULT_DATA_PATH = os.path.join(_PROJECT_ROOT, "data", "束流.csv")
+
+
+def _top_features(contributions: np.ndarray, names: list, k: int = 3) -> Dict[str, float]:
+    """
+    取贡献度最大的 k 个特征
+    
+    先用 argpartition 选出前 k 个，再只对这 k 个排序，不对全部特征做完整排序。
+    
+    Args:
+        contributions: 各特征的贡献度
+        names: 特征名列表，与 contributions 一一对应
+        k: 返回的特征数
+    
+    Returns:
+        {特征名: 贡献度} 字典，按贡献度从大到小排列
+    """
+    if k < len(contributions):
+        idx = np.argpartition(contributions, -k)[-k:]
+    else:
+        idx = np.arange(len(contributions))
+    idx = idx[np.argsort(-contributions[idx], kind='stable')]
+    return dict(zip([names[i] for i in idx], contributions[idx].tolist()))
 
 
 class PLSAnalysisTool:
@@ -34,12 +65,8 @@ class PLSAnalysisTool:
             model_path: PLS 模型文件路径，默认为 "models/pls_model.pkl"
             data_path: CSV数据文件路径，默认为 "data/束流.csv"
         """
-        # 获取项目根目录
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        project_root = os.path.dirname(current_dir)
-        
-        self.model_path = model_path or os.path.join(project_root, "models", "pls_model.pkl")
-        self.data_path = data_path or os.path.join(project_root, "data", "束流.csv")
+        self.model_path = model_path or DEFAULT_MODEL_PATH
+        self.data_path = data_path or DEFAULT_DATA_PATH
         self.pls_model = None
         self.scaler_X = None
         self.scaler_Y = None
@@ -54,14 +81,18 @@ class PLSAnalysisTool:
         if not os.path.exists(self.model_path):
             raise FileNotFoundError(f"模型文件不存在: {self.model_path}")
         
+        # joblib 仅在加载模型时需要，延迟导入以加快工具模块的导入
+        import joblib
+        
         print(f"加载 PLS 模型: {self.model_path}")
         artifacts = joblib.load(self.model_path)
         self.pls_model = artifacts['pls_model']
         self.scaler_X = artifacts['scaler_X']
         self.scaler_Y = artifacts.get('scaler_Y', None)
         self.eigen_values_pls = artifacts['eigen_values_pls']
-        self.UCL_T2X = artifacts['UCL_T2X']
-        self.UCL_SPEX = artifacts['UCL_SPEX_approx']
+        # 控制限转换为 Python float，比较结果和返回结果中均为原生类型
+        self.UCL_T2X = float(artifacts['UCL_T2X'])
+        self.UCL_SPEX = float(artifacts['UCL_SPEX_approx'])
         self.feature_names = artifacts.get('feature_names', None)
         
         # 如果没有特征名，根据模型维度生成
@@ -69,36 +100,48 @@ class PLSAnalysisTool:
             n_features = self.pls_model.n_features_in_
             self.feature_names = [f'feature{i+1}' for i in range(n_features)]
         
+        # 预计算统计量内核参数：transform 先按模型自身的均值/标准差归一化再投影，是仿射变换，
+        # 合并为 T = X @ R - offset。通过公开的 transform 求出（不依赖 sklearn 的私有属性）：
+        # 零向量的得分即 -offset，单位矩阵各行的得分加上 offset 即 R 的各行
+        n_features = self.pls_model.n_features_in_
+        self._scores_offset = -self.pls_model.transform(np.zeros((1, n_features)))[0]
+        self._rotations = np.ascontiguousarray(
+            self.pls_model.transform(np.eye(n_features)) + self._scores_offset
+        )
+        self._loadings = np.ascontiguousarray(self.pls_model.x_loadings_)
+        self._inv_eig = 1.0 / np.asarray(self.eigen_values_pls, dtype=np.float64)
+        # T² 贡献度 Σ_k P_jk² t_k² / λ_k = P² @ (t² / λ)，预先计算载荷平方
+        self._P2 = self._loadings ** 2
+        
+        # 标准化参数，供 project_raw 将标准化与投影合并计算
+        self._scaler_mean = self.scaler_X.mean_ if self.scaler_X.with_mean else np.zeros(n_features)
+        self._scaler_scale = self.scaler_X.scale_ if self.scaler_X.with_std else np.ones(n_features)
+        _warmup_kernels()
+        
         print(f"模型加载成功，特征数: {len(self.feature_names)}")
     
-    def _compute_pls_stats(self, X_scaled: np.ndarray) -> tuple:
+    def project_raw(self, X_raw: np.ndarray) -> tuple:
         """
-        计算 T²_X 和 SPE_X 统计量
+        由原始特征数据直接计算 T²_X 和 SPE_X 统计量
+        
+        标准化在统计量内核中与投影一并完成，不单独生成标准化后的数据矩阵，
+        结果与先 scaler_X.transform 再计算统计量一致。
         
         Args:
-            X_scaled: 标准化后的特征数据
+            X_raw: 原始特征数据，列顺序与 feature_names 一致
             
         Returns:
-            (T2X, SPEX, E_X) 统计量数组
+            (T2X, SPEX) 统计量数组
         """
-        # 计算得分矩阵 T
-        T = self.pls_model.transform(X_scaled)
-        
-        # 计算 T²_X 统计量
-        T2X = np.sum(T**2 / self.eigen_values_pls, axis=1)
-        
-        # 计算 SPE_X 统计量
-        P_X_matrix = self.pls_model.x_loadings_
-        X_hat = np.dot(T, P_X_matrix.T)  # 重构的 X
-        E_X = X_scaled - X_hat  # 残差
-        SPE_X = np.sum(E_X**2, axis=1)
-        
-        return T2X, SPE_X, E_X
+        return t2_spe(X_raw, self._rotations, self._scores_offset, self._loadings, self._inv_eig,
+                      mean=self._scaler_mean, scale=self._scaler_scale)
     
     def analyze_fluctuation(
         self,
         start_time: str,
-        end_time: str
+        end_time: str,
+        return_arrays: bool = False,
+        with_knowledge: bool = True
     ) -> Dict[str, Any]:
         """
         分析指定时间范围内数据的波动情况
@@ -106,31 +149,29 @@ class PLSAnalysisTool:
         Args:
             start_time: 开始时间，格式如 "2025-08-30 17:23:26"
             end_time: 结束时间，格式如 "2025-08-30 18:23:30"
+            return_arrays: 是否在结果的 "_arrays" 键中附带逐样本的 T2X、SPEX 和时间序列，
+                供绘图复用（该键不可 JSON 序列化，返回给 LLM 前需移除）
+            with_knowledge: 有异常时是否用知识库补充异常解释和处理建议（见 enrich_with_knowledge）
         
         Returns:
             包含分析结果的字典
         """
         try:
-            # 1. 查询数据
-            # 确保 DataQueryTool 使用正确的路径
-            import os
-            data_path_abs = os.path.abspath(self.data_path)
-            query_tool = DataQueryTool(data_path=data_path_abs)
-            result = query_tool.query_by_time_range(start_time, end_time)
-            
-            if not result.get('success', False):
+            # 1. 查询数据（复用已加载的数据）
+            query_tool = get_data_query_tool(self.data_path)
+            try:
+                start_dt = pd.to_datetime(start_time)
+                end_dt = pd.to_datetime(end_time)
+                lo, hi = query_tool.locate_time_range(start_dt, end_dt)
+            except Exception as e:
                 return {
                     "success": False,
-                    "error": result.get('error', '未知错误'),
+                    "error": str(e),
                     "message": "数据查询失败"
                 }
             
-            # 2. 提取特征数据
-            query_tool.df['时间'] = pd.to_datetime(query_tool.df['时间'])
-            start_dt = pd.to_datetime(start_time)
-            end_dt = pd.to_datetime(end_time)
-            mask = (query_tool.df['时间'] >= start_dt) & (query_tool.df['时间'] <= end_dt)
-            data_df = query_tool.df[mask].copy()
+            # 2. 提取特征数据（数据已按时间排序，直接取行切片，不复制、不修改共享的 df）
+            data_df = query_tool.df.iloc[lo:hi]
             
             if len(data_df) == 0:
                 return {
@@ -139,9 +180,8 @@ class PLSAnalysisTool:
                     "message": f"在 {start_time} 到 {end_time} 范围内未找到数据"
                 }
             
-            # 提取特征列（feature1 到 feature35）
-            feature_cols = [col for col in data_df.columns if col.startswith('feature')]
-            feature_cols.sort(key=lambda x: int(x.replace('feature', '')))  # 按数字排序
+            # 特征列（feature1 到 feature35，按数字排序）在加载数据时已确定
+            feature_cols = query_tool.feature_cols
             
             if len(feature_cols) == 0:
                 return {
@@ -158,64 +198,52 @@ class PLSAnalysisTool:
                     "message": "数据特征维度与模型不匹配"
                 }
             
-            X_data = data_df[feature_cols].values
-            
-            # 3. 数据标准化
-            X_scaled = self.scaler_X.transform(X_data)
+            # 直接切片加载时缓存的行优先 float64 特征矩阵，不经过 pandas 取列
+            X_data = query_tool.feature_matrix[lo:hi]
             
-            # 4. 计算统计量
-            T2X, SPEX, E_X = self._compute_pls_stats(X_scaled)
+            # 3-4. 标准化并计算统计量：逐行（或分块）完成，不生成整个窗口的标准化矩阵和残差矩阵，
+            # 贡献度分析需要的单个样本在下面单独计算
+            T2X, SPEX = self.project_raw(X_data)
             
-            # 5. 检测异常
-            anomalies_T2X = T2X > self.UCL_T2X
-            anomalies_SPEX = SPEX > self.UCL_SPEX
-            anomalies_combined = anomalies_T2X | anomalies_SPEX
+            # 5. 检测异常并统计（一次遍历完成各项汇总和第一个异常点定位）
+            (T2X_mean, T2X_max, T2X_min, T2X_std,
+             SPEX_mean, SPEX_max, SPEX_min, SPEX_std,
+             T2X_anomaly_count, SPEX_anomaly_count,
+             anomaly_count, first_anomaly_idx) = summarize(T2X, SPEX, self.UCL_T2X, self.UCL_SPEX)
             
             # 6. 统计信息
-            anomaly_count = np.sum(anomalies_combined)
-            anomaly_rate = float(anomaly_count / len(T2X)) if len(T2X) > 0 else 0.0
+            anomaly_rate = anomaly_count / len(T2X) if len(T2X) > 0 else 0.0
             
             # 7. 找出第一个异常点及其贡献度
             first_anomaly_info = None
             if anomaly_count > 0:
-                first_anomaly_idx = np.where(anomalies_combined)[0][0]
                 first_anomaly_time = data_df.iloc[first_anomaly_idx]['时间']
+                T2X_value = T2X[first_anomaly_idx].item()
+                SPEX_value = SPEX[first_anomaly_idx].item()
+                is_T2X_anomaly = T2X_value > self.UCL_T2X
+                is_SPEX_anomaly = SPEX_value > self.UCL_SPEX
                 
                 anomaly_info = {
-                    "index": int(first_anomaly_idx),
+                    "index": first_anomaly_idx,
                     "time": str(first_anomaly_time),
-                    "T2X_value": float(T2X[first_anomaly_idx]),
-                    "SPEX_value": float(SPEX[first_anomaly_idx]),
-                    "T2X_anomaly": bool(anomalies_T2X[first_anomaly_idx]),
-                    "SPEX_anomaly": bool(anomalies_SPEX[first_anomaly_idx])
+                    "T2X_value": T2X_value,
+                    "SPEX_value": SPEX_value,
+                    "T2X_anomaly": is_T2X_anomaly,
+                    "SPEX_anomaly": is_SPEX_anomaly
                 }
                 
                 # 计算贡献度
-                if anomalies_T2X[first_anomaly_idx]:
-                    t_anomaly = self.pls_model.transform(X_scaled[first_anomaly_idx].reshape(1, -1))[0]
-                    T2X_contributions = np.sum(
-                        (t_anomaly[:, np.newaxis] * self.pls_model.x_loadings_.T)**2 / 
-                        self.eigen_values_pls[:, np.newaxis], 
-                        axis=0
-                    )
-                    top_T2X_features = pd.Series(
-                        T2X_contributions, 
-                        index=self.feature_names
-                    ).sort_values(ascending=False).head(3)
-                    anomaly_info["T2X_top_features"] = {
-                        name: float(val) for name, val in top_T2X_features.items()
-                    }
+                # 该样本的标准化数据和得分（与 pls_model.transform 等价），T² 和 SPE 贡献度共用
+                x_anomaly = (X_data[first_anomaly_idx] - self._scaler_mean) / self._scaler_scale
+                t_anomaly = x_anomaly @ self._rotations - self._scores_offset
+                if is_T2X_anomaly:
+                    T2X_contributions = self._P2 @ (t_anomaly**2 * self._inv_eig)
+                    anomaly_info["T2X_top_features"] = _top_features(T2X_contributions, self.feature_names)
                 
-                if anomalies_SPEX[first_anomaly_idx]:
-                    e_anomaly = E_X[first_anomaly_idx]
+                if is_SPEX_anomaly:
+                    e_anomaly = x_anomaly - self._loadings @ t_anomaly
                     SPEX_contributions = e_anomaly**2
-                    top_SPEX_features = pd.Series(
-                        SPEX_contributions,
-                        index=self.feature_names
-                    ).sort_values(ascending=False).head(3)
-                    anomaly_info["SPEX_top_features"] = {
-                        name: float(val) for name, val in top_SPEX_features.items()
-                    }
+                    anomaly_info["SPEX_top_features"] = _top_features(SPEX_contributions, self.feature_names)
                 
                 first_anomaly_info = anomaly_info
             
@@ -226,58 +254,45 @@ class PLSAnalysisTool:
                 "end_time": end_time,
                 "data_count": len(data_df),
                 "statistics": {
-                    "T2X_mean": float(np.mean(T2X)),
-                    "T2X_max": float(np.max(T2X)),
-                    "T2X_min": float(np.min(T2X)),
-                    "T2X_std": float(np.std(T2X)),
-                    "SPEX_mean": float(np.mean(SPEX)),
-                    "SPEX_max": float(np.max(SPEX)),
-                    "SPEX_min": float(np.min(SPEX)),
-                    "SPEX_std": float(np.std(SPEX))
+                    "T2X_mean": T2X_mean,
+                    "T2X_max": T2X_max,
+                    "T2X_min": T2X_min,
+                    "T2X_std": T2X_std,
+                    "SPEX_mean": SPEX_mean,
+                    "SPEX_max": SPEX_max,
+                    "SPEX_min": SPEX_min,
+                    "SPEX_std": SPEX_std
                 },
                 "thresholds": {
-                    "UCL_T2X": float(self.UCL_T2X),
-                    "UCL_SPEX": float(self.UCL_SPEX)
+                    "UCL_T2X": self.UCL_T2X,
+                    "UCL_SPEX": self.UCL_SPEX
                 },
                 "anomaly_detection": {
                     "total_samples": len(T2X),
-                    "anomaly_count": int(anomaly_count),
+                    "anomaly_count": anomaly_count,
                     "anomaly_rate": round(anomaly_rate, 4),
-                    "T2X_anomaly_count": int(np.sum(anomalies_T2X)),
-                    "SPEX_anomaly_count": int(np.sum(anomalies_SPEX)),
+                    "T2X_anomaly_count": T2X_anomaly_count,
+                    "SPEX_anomaly_count": SPEX_anomaly_count,
                     "first_anomaly": first_anomaly_info
                 },
                 "summary": {
-                    "has_anomaly": bool(anomaly_count > 0),
+                    "has_anomaly": anomaly_count > 0,
                     "status": "异常" if anomaly_count > 0 else "正常",
                     "message": f"检测到 {anomaly_count} 个异常点（异常率: {anomaly_rate:.2%}）" if anomaly_count > 0 
                               else "未检测到异常，数据波动在正常范围内"
                 }
             }
             
+            if return_arrays:
+                result["_arrays"] = {
+                    "T2X": T2X,
+                    "SPEX": SPEX,
+                    "time": data_df['时间'].to_numpy()
+                }
+            
             # 9. 知识增强（如果有异常且RAG可用）
-            try:
-                from knowledge.rag_tool import RAGTool
-                
-                if anomaly_count > 0 and first_anomaly_info:
-                    rag_tool = RAGTool()
-                    
-                    # 获取综合分析和建议
-                    knowledge_result = rag_tool.get_comprehensive_analysis(first_anomaly_info)
-                    
-                    if knowledge_result.get("success"):
-                        result["knowledge_enhanced"] = {
-                            "summary": knowledge_result.get("summary", ""),
-                            "feature_explanations": knowledge_result.get("feature_explanations", {}),
-                            "solutions": knowledge_result.get("solutions", []),
-                            "relevant_concepts": knowledge_result.get("relevant_concepts", [])
-                        }
-            except ImportError:
-                # RAG模块未安装或不可用，跳过知识增强
-                pass
-            except Exception as e:
-                # RAG出错不影响主流程
-                print(f"知识增强失败: {str(e)}")
+            if with_knowledge:
+                self.enrich_with_knowledge(result)
             
             return result
             
@@ -287,6 +302,40 @@ class PLSAnalysisTool:
                 "error": str(e),
                 "message": f"分析失败: {str(e)}"
             }
+    
+    @staticmethod
+    def enrich_with_knowledge(result: Dict[str, Any]) -> None:
+        """
+        用知识库补充分析结果中第一个异常点的解释和处理建议
+        
+        结果中有异常且 RAG 可用时，原地添加 "knowledge_enhanced" 键；RAG 不可用或出错时不修改结果。
+        
+        Args:
+            result: analyze_fluctuation 的分析结果
+        """
+        try:
+            from knowledge.rag_tool import RAGTool
+            
+            first_anomaly_info = result.get("anomaly_detection", {}).get("first_anomaly")
+            if first_anomaly_info:
+                rag_tool = RAGTool()
+                
+                # 获取综合分析和建议
+                knowledge_result = rag_tool.get_comprehensive_analysis(first_anomaly_info)
+                
+                if knowledge_result.get("success"):
+                    result["knowledge_enhanced"] = {
+                        "summary": knowledge_result.get("summary", ""),
+                        "feature_explanations": knowledge_result.get("feature_explanations", {}),
+                        "solutions": knowledge_result.get("solutions", []),
+                        "relevant_concepts": knowledge_result.get("relevant_concepts", [])
+                    }
+        except ImportError:
+            # RAG模块未安装或不可用，跳过知识增强
+            pass
+        except Exception as e:
+            # RAG出错不影响主流程
+            print(f"知识增强失败: {str(e)}")
 
 
 # 定义 PLS 分析工具的工具描述（OpenAI Function Calling格式）
@@ -315,6 +364,76 @@ PLS_ANALYSIS_TOOLS = [
 ]
 
 
+@functools.lru_cache(maxsize=4)
+def _get_tool(model_path: str, data_path: str, model_mtime: float) -> PLSAnalysisTool:
+    """按模型路径、数据路径和模型文件修改时间缓存 PLSAnalysisTool 实例"""
+    return PLSAnalysisTool(model_path=model_path, data_path=data_path)
+
+
+def get_pls_analysis_tool(
+    model_path: Optional[str] = None,
+    data_path: Optional[str] = None
+) -> PLSAnalysisTool:
+    """
+    获取共享的 PLSAnalysisTool 实例
+    
+    同一模型文件只加载一次；模型文件被修改后（修改时间变化）自动重新加载。
+    数据文件由 get_data_query_tool 按修改时间单独缓存。
+    
+    Args:
+        model_path: PLS 模型文件路径，默认为 "models/pls_model.pkl"
+        data_path: CSV数据文件路径，默认为 "data/束流.csv"
+    
+    Returns:
+        PLSAnalysisTool 实例
+    """
+    model_path = os.path.abspath(model_path or DEFAULT_MODEL_PATH)
+    data_path = os.path.abspath(data_path or DEFAULT_DATA_PATH)
+    if not os.path.exists(model_path):
+        raise FileNotFoundError(f"模型文件不存在: {model_path}")
+    return _get_tool(model_path, data_path, os.path.getmtime(model_path))
+
+
+def _get_mtime(path: str) -> Optional[float]:
+    """获取文件修改时间，文件不存在时返回 None"""
+    return os.path.getmtime(path) if os.path.exists(path) else None
+
+
+class _AnalysisFailed(Exception):
+    """分析失败时由 _analyze_cached 抛出，使失败结果不进入缓存"""
+
+
+@functools.lru_cache(maxsize=32)
+def _analyze_cached(
+    start_ns: int,
+    end_ns: int,
+    data_mtime: Optional[float],
+    model_mtime: Optional[float]
+) -> Dict[str, Any]:
+    """
+    按时间窗口缓存的 PLS 分析（不含知识增强）
+    
+    相同时间窗口的分析结果是确定的；数据文件或模型文件的修改时间作为缓存键的一部分，
+    文件更新后缓存自动失效。只缓存成功的结果，失败时抛出 _AnalysisFailed。
+    
+    Args:
+        start_ns: 开始时间（纳秒时间戳）
+        end_ns: 结束时间（纳秒时间戳）
+        data_mtime: 数据文件修改时间
+        model_mtime: 模型文件修改时间
+    
+    Returns:
+        analyze_fluctuation 的分析结果（调用方不应修改）
+    """
+    tool = get_pls_analysis_tool()
+    result = tool.analyze_fluctuation(
+        str(pd.Timestamp(start_ns)), str(pd.Timestamp(end_ns)), with_knowledge=False
+    )
+    if not result.get('success', False):
+        raise _AnalysisFailed()
+    return result
+
+
 # 定义供LLM调用的工具函数
 def analyze_beam_fluctuation(start_time: str, end_time: str) -> Dict[str, Any]:
     """
@@ -333,8 +452,34 @@ def analyze_beam_fluctuation(start_time: str, end_time: str) -> Dict[str, Any]:
         - 第一个异常点的详细信息（包括导致异常的主要特征）
     """
     try:
-        tool = PLSAnalysisTool()
-        return tool.analyze_fluctuation(start_time, end_time)
+        tool = get_pls_analysis_tool()
+        try:
+            start_dt = pd.to_datetime(start_time)
+            end_dt = pd.to_datetime(end_time)
+        except Exception:
+            start_dt = end_dt = None
+        if start_dt is None or start_dt.tzinfo is not None or end_dt.tzinfo is not None:
+            # 时间无法解析或带时区（.value 为 UTC 时间，不能作为缓存键）时不使用缓存，
+            # 由 analyze_fluctuation 返回与直接调用一致的错误信息
+            return tool.analyze_fluctuation(start_time, end_time)
+        start_ns = start_dt.value
+        end_ns = end_dt.value
+        try:
+            result = copy.deepcopy(_analyze_cached(
+                start_ns,
+                end_ns,
+                _get_mtime(DEFAULT_DATA_PATH),
+                _get_mtime(DEFAULT_MODEL_PATH)
+            ))
+        except _AnalysisFailed:
+            # 失败结果不缓存；直接分析，错误信息中保留调用方传入的时间字符串
+            return tool.analyze_fluctuation(start_time, end_time)
+        # 保留调用方传入的原始时间字符串
+        result['start_time'] = start_time
+        result['end_time'] = end_time
+        # 知识增强依赖知识库内容，不缓存，每次调用时补充
+        tool.enrich_with_knowledge(result)
+        return result
     except Exception as e:
         return {
             "success": False,